@@ -1,8 +1,11 @@
-from collections import deque
-import functools
+from collections import deque, namedtuple
+import heapq
+from operator import itemgetter
 import re
 from typing import Dict, List
 
+import numpy as np
+
 from torch.profiler import DeviceType
 from torch.autograd.profiler import profile
 from torch.autograd import _KinetoEvent
@@ -11,27 +14,53 @@ from torch.profiler._utils import (
     EventMetrics,
     Interval,
     EventKey,
-    index_of_first_match,
-    argmax,
     source_code_location
 )
 
-def _traverse(tree, next_fn, children_fn=lambda x: x.children, reverse: bool = False):
-    order = reversed if reverse else lambda x: x
-    remaining = deque(order(tree))
-    while remaining:
-        curr_event = next_fn(remaining)
+# Kind tags attached to events when merging MLU and profiler timelines in
+# compute_queue_depth, so the main loop branches on an int instead of
+# probing each event with hasattr.
+_EVENT_KIND_LAUNCH = 0
+_EVENT_KIND_KERNEL = 1
+_EVENT_KIND_PROFILE = 2
+
+# Case-insensitive "mem" substring test used to filter memcpy/memset style
+# activity out of the MLU kernel list. A precompiled pattern avoids
+# allocating a lowercased copy of every event name.
+_MEM_NAME_PATTERN = re.compile("mem", re.IGNORECASE)
+
+# Immutable snapshot of the pybind accessors of an MLU kineto event, taken
+# once so the queue depth computation works on plain Python ints.
+_MluEventSnapshot = namedtuple(
+    '_MluEventSnapshot', ['start_ns', 'end_ns', 'correlation_id', 'event'])
+
+def traverse_dfs(tree, children_fn=lambda x: x.children):
+    # DFS only needs LIFO semantics, so a plain list beats a deque here.
+    stack = list(tree)
+    stack.reverse()
+    while stack:
+        curr_event = stack.pop()
         yield curr_event
-        for child_event in order(children_fn(curr_event)):
-            remaining.append(child_event)
+        stack.extend(reversed(children_fn(curr_event)))
 
-traverse_dfs = functools.partial(_traverse, next_fn=lambda x: x.pop(), reverse=True)
-traverse_bfs = functools.partial(_traverse, next_fn=lambda x: x.popleft(), reverse=False)
+def traverse_bfs(tree, children_fn=lambda x: x.children):
+    queue = deque(tree)
+    while queue:
+        curr_event = queue.popleft()
+        yield curr_event
+        queue.extend(children_fn(curr_event))
 
 class BasicEvaluation:
 
     def __init__(self, prof: profile):
         self.profile = prof
+        assert (self.profile.kineto_results is not None)
+        # Snapshot the kineto results once; every call re-materializes the
+        # C++ objects across pybind, and this also guarantees the compute
+        # passes below all see the same events.
+        self._event_tree = self.profile.kineto_results.experimental_event_tree(
+        )
+        self._kineto_events = self.profile.kineto_results.events()
         self.metrics: Dict[EventKey, EventMetrics] = {}
         self.compute_self_time()
         self.event_keys = sorted((e for e in self.metrics.keys()),
@@ -45,23 +74,23 @@ class BasicEvaluation:
         '''
         Computes event's self time(total time - time in child ops).
         '''
-        assert (self.profile.kineto_results is not None)
-        stack = deque(self.profile.kineto_results.experimental_event_tree())
+        stack = list(self._event_tree)
 
         # standard iterating dfs
         while stack:
             curr_event = stack.pop()
-            self_time = curr_event.duration_time_ns
-            for child_event in curr_event.children:
-                self_time -= child_event.duration_time_ns
-                stack.append(child_event)
-            assert EventKey(
-                curr_event
-            ) not in self.metrics, f"Duplicate id: {curr_event.id}, {curr_event.name}"
-            self.metrics[EventKey(curr_event)] = EventMetrics(
-                self_time_ns=self_time)
-            self.metrics[EventKey(
-                curr_event)].duration_time_ns = curr_event.duration_time_ns
+            # Materialize the children list once; each .children access
+            # crosses the pybind boundary.
+            children = curr_event.children
+            self_time = curr_event.duration_time_ns - sum(
+                child_event.duration_time_ns for child_event in children)
+            stack.extend(children)
+            event_key = EventKey(curr_event)
+            assert event_key not in self.metrics, \
+                f"Duplicate id: {curr_event.id}, {curr_event.name}"
+            event_metrics = EventMetrics(self_time_ns=self_time)
+            event_metrics.duration_time_ns = curr_event.duration_time_ns
+            self.metrics[event_key] = event_metrics
     
     def compute_queue_depth(self):
         '''
@@ -69,8 +98,7 @@ class BasicEvaluation:
         All the events in the tree.
         This will return a list of Interval of queue depth data of mlu launch and kernels.
         '''
-        assert (self.profile.kineto_results is not None)
-        mlu_event_list = self.profile.kineto_results.events()
+        mlu_event_list = self._kineto_events
 
         def is_mlu_launch_kernel(e):
             # TODO: find a better way to identify cnInvokeKernel
@@ -78,68 +106,111 @@ class BasicEvaluation:
 
         def is_mlu_kernel(e):
             # TODO: find a better way to identify MLU Kernel
-            return e.device_type() == DeviceType.MLU and "mem" not in e.name.lower()
-
-        mlu_launch_events = sorted(
-            (e for e in mlu_event_list if is_mlu_launch_kernel(e)),
-            key=lambda x: x.start_us())
-        mlu_kernel_events = sorted(
-            (e for e in mlu_event_list if is_mlu_kernel(e)),
-            key=lambda x: x.start_us())
-
-        self.mlu_events = sorted(mlu_launch_events + mlu_kernel_events,
-                                  key=lambda x: x.start_us())
-
-        kernel_mapping: Dict[_KinetoEvent, int] = {}
-        last_mapped_kernel = 0
-        for mlu_launch_event in mlu_launch_events:
-            index = index_of_first_match(
-                mlu_kernel_events,
-                lambda x: x.linked_correlation_id(
-                ) == mlu_launch_event.linked_correlation_id(),
-                start=last_mapped_kernel)
-            kernel_mapping[mlu_launch_event] = index
-            last_mapped_kernel = index if index is not None else last_mapped_kernel
-
-        current_kernel_index = 0
-        spawned_kernel_index = -1
-
-        all_events = mlu_launch_events + mlu_kernel_events + self.events
-
-        def new_old_event_comparator(event):
-            if hasattr(event, "start_us"):
-                return event.start_us() * 1000
-            if hasattr(event, "start_time_ns"):
-                return event.start_time_ns
-            raise Exception("Unknown Event Type")
+            return (e.device_type() == DeviceType.MLU
+                    and _MEM_NAME_PATTERN.search(e.name) is None)
+
+        # Filter and decorate the MLU events in one pass, then sort them a
+        # single time on (start_ns, tag); launches sort before kernels that
+        # share a start time, matching the old launches-then-kernels order.
+        tagged_mlu_events = []
+        for e in mlu_event_list:
+            if is_mlu_launch_kernel(e):
+                kind = _EVENT_KIND_LAUNCH
+            elif is_mlu_kernel(e):
+                kind = _EVENT_KIND_KERNEL
+            else:
+                continue
+            # Snapshot the pybind accessors once; the rest of the computation
+            # only touches plain Python ints.
+            start_ns = e.start_us() * 1000
+            tagged_mlu_events.append(
+                (start_ns, kind,
+                 _MluEventSnapshot(start_ns,
+                                   start_ns + e.duration_us() * 1000,
+                                   e.linked_correlation_id(), e)))
+        # CPU-only captures have no MLU activity at all; skip the sort and
+        # merge machinery and the walk over every profile event. EventMetrics
+        # queue depths already default to zero.
+        if not tagged_mlu_events:
+            self.mlu_events = []
+            return []
+
+        tagged_mlu_events.sort(key=itemgetter(0, 1))
+
+        mlu_kernel_events = [
+            snapshot for _, kind, snapshot in tagged_mlu_events
+            if kind == _EVENT_KIND_KERNEL
+        ]
+        self.mlu_events = [
+            snapshot.event for _, _, snapshot in tagged_mlu_events
+        ]
+
+        kernel_starts_ns = np.fromiter(
+            (kernel.start_ns for kernel in mlu_kernel_events),
+            dtype=np.int64, count=len(mlu_kernel_events))
+
+        # Map each launch to its kernel in one pass over the kernel list
+        # instead of rescanning it per launch. The correlation ids are plain
+        # ints, so no pybind __hash__ is involved.
+        corr_to_kernel_index: Dict[int, int] = {}
+        for index, mlu_kernel_event in enumerate(mlu_kernel_events):
+            corr_to_kernel_index.setdefault(
+                mlu_kernel_event.correlation_id, index)
+
+        # Resolve each launch's spawned kernel index while building the merge
+        # tuples, so the main loop carries plain int payloads and no dict
+        # keyed on pybind events survives. Payload is the resolved kernel
+        # index for launches (None if unmatched) and the profiler event for
+        # profile entries.
+        merged_mlu_events = [
+            (start_ns, kind, snapshot.end_ns,
+             corr_to_kernel_index.get(snapshot.correlation_id)
+             if kind == _EVENT_KIND_LAUNCH else None)
+            for start_ns, kind, snapshot in tagged_mlu_events
+        ]
+
+        # Both inputs are already sorted on their precomputed start key, so a
+        # linear merge replaces the final O(n log n) sort. On equal keys merge
+        # keeps MLU events ahead of profile events, as the old stable sort of
+        # the concatenated list did.
+        profile_events = [(e.start_time_ns, _EVENT_KIND_PROFILE,
+                           e.end_time_ns, e) for e in self.events]
+        all_events = list(
+            heapq.merge(merged_mlu_events, profile_events,
+                        key=itemgetter(0)))
+        num_events = len(all_events)
+
+        # The queue depth recurrence is pure integer arithmetic once the
+        # inputs are arrays: the number of kernels completed before each
+        # event is a batched binary search over the kernel start times, and
+        # the spawned kernel index is the latest launch payload seen so far,
+        # i.e. a forward fill. Both run in C instead of a per-event Python
+        # loop body.
+        start_times = np.fromiter((e[0] for e in all_events),
+                                  dtype=np.int64, count=num_events)
+        spawned_indices = np.fromiter(
+            (e[3] if e[1] == _EVENT_KIND_LAUNCH and e[3] is not None else -1
+             for e in all_events),
+            dtype=np.int64, count=num_events)
+        current_kernel_indices = np.searchsorted(kernel_starts_ns,
+                                                 start_times, side='right')
+        last_launch_positions = np.maximum.accumulate(
+            np.where(spawned_indices >= 0, np.arange(num_events), -1))
+        spawned_kernel_indices = np.where(
+            last_launch_positions >= 0,
+            spawned_indices[np.maximum(last_launch_positions, 0)], -1)
+        queue_depths = np.maximum(
+            spawned_kernel_indices - current_kernel_indices + 1, 0)
 
         queue_depth_list: List[Interval] = []
-        all_events.sort(key=new_old_event_comparator)
-        for event in all_events:
-            # Find latest mlu kernel event
-            if hasattr(event, "start_us"):
-                start_time = event.start_us() * 1000
-                end_time = (event.start_us() + event.duration_us()) * 1000
-                # Find current spawned mlu kernel event
-                if event in kernel_mapping and kernel_mapping[
-                        event] is not None:
-                    spawned_kernel_index = kernel_mapping[event]
-            elif hasattr(event, "start_time_ns"):
-                start_time = event.start_time_ns  # type: ignore[attr-defined]
-                end_time = event.end_time_ns  # type: ignore[attr-defined]
-
-            while (current_kernel_index < len(mlu_kernel_events) and
-                   (mlu_kernel_events[current_kernel_index].start_us()) * 1000
-                   <= start_time):
-                current_kernel_index += 1
-            current_queue_depth = spawned_kernel_index - current_kernel_index + 1
-            current_queue_depth = max(current_queue_depth, 0)
-
-            if hasattr(event, "start_us"):
+        for (start_time, kind, end_time, payload), current_queue_depth in zip(
+                all_events, queue_depths.tolist()):
+            if kind == _EVENT_KIND_PROFILE:
+                self.metrics[EventKey(
+                    payload)].queue_depth = current_queue_depth
+            else:
                 queue_depth_list.append(
                     Interval(start_time, end_time, current_queue_depth))
-            elif hasattr(event, "start_time_ns"):
-                self.metrics[EventKey(event)].queue_depth = current_queue_depth
 
         return queue_depth_list
 
@@ -167,10 +238,30 @@ class BasicEvaluation:
                 idle_intervals.append(Interval(idle_start, data_point.start))
                 idle = False
 
-        event_list = [e.event for e in self.metrics.keys()]
-        for event in event_list:
-            self.metrics[EventKey(event)].idle_time_ns = EventKey(
-                event).intervals_overlap(idle_intervals)
+        if not idle_intervals:
+            return
+
+        # intervals_overlap re-sorts and scans the interval list for every
+        # event. Merge the intervals into disjoint start/end arrays once and
+        # compute each event's overlap with a single vectorized clip-and-sum.
+        idle_intervals.sort(key=lambda x: x.start)
+        merged_starts: List[int] = []
+        merged_ends: List[int] = []
+        for interval in idle_intervals:
+            if merged_ends and interval.start <= merged_ends[-1]:
+                if interval.end > merged_ends[-1]:
+                    merged_ends[-1] = interval.end
+            else:
+                merged_starts.append(interval.start)
+                merged_ends.append(interval.end)
+        idle_starts = np.array(merged_starts, dtype=np.int64)
+        idle_ends = np.array(merged_ends, dtype=np.int64)
+
+        for event_key, event_metrics in self.metrics.items():
+            event = event_key.event
+            overlap_ns = (np.minimum(idle_ends, event.end_time_ns) -
+                          np.maximum(idle_starts, event.start_time_ns))
+            event_metrics.idle_time_ns = int(overlap_ns[overlap_ns > 0].sum())
 
     def rank_events(self, length):
         '''
@@ -183,60 +274,66 @@ class BasicEvaluation:
         '''
 
         # Find the interval when qd is falling to 0
-        import torch
         queue_depth_list = list(reversed(self.queue_depth_list))
         qd_values = [e.queue_depth for e in queue_depth_list]
 
         bottom_threashold = 0
         top_threashold = 4
         decrease_interval = []
-        i = 0
-        while (i < len(qd_values)):
-            if qd_values[i] > bottom_threashold:
-                i += 1
-                continue
-            for j in range(i + 1, len(qd_values)):
-                # Find next zero and if the max value between them exceeds
-                # the threshold, then we have a falling interval
-                next_minimum_idx = index_of_first_match(
-                    qd_values, lambda x: x <= bottom_threashold, start=j)
-                peak_idx = argmax(qd_values, start=j, end=next_minimum_idx)
-
-                # if is a valid peak, we add to list and continue
-                if peak_idx is not None and qd_values[
-                        peak_idx] >= top_threashold:
+        # Single left-to-right sweep: remember the zero opening each run and
+        # the first peak inside it, and emit a falling interval whenever the
+        # run closes with a high enough peak. This replaces the nested
+        # index_of_first_match/argmax rescans, which were O(N^2) worst case.
+        anchor_idx = None
+        peak_idx = None
+        for i, qd in enumerate(qd_values):
+            if qd <= bottom_threashold:
+                if (anchor_idx is not None and peak_idx is not None
+                        and qd_values[peak_idx] >= top_threashold):
                     decrease_interval.append(
                         Interval(queue_depth_list[peak_idx].start,
-                                 queue_depth_list[i].start))
-                    i = next_minimum_idx if next_minimum_idx is not None else i
-                    break
-            i += 1
+                                 queue_depth_list[anchor_idx].start))
+                anchor_idx = i
+                peak_idx = None
+            elif anchor_idx is not None and (peak_idx is None
+                                             or qd > qd_values[peak_idx]):
+                peak_idx = i
+        if (anchor_idx is not None and peak_idx is not None
+                and qd_values[peak_idx] >= top_threashold):
+            decrease_interval.append(
+                Interval(queue_depth_list[peak_idx].start,
+                         queue_depth_list[anchor_idx].start))
         # Filter out events that are not in the decrease interval
         event_list = [
             event for event in self.metrics.keys()
             if event.intervals_overlap(decrease_interval)
         ]
         if event_list:
-            self_time = torch.tensor(
-                [self.metrics[event].self_time_ns for event in event_list],
-                dtype=torch.float32)
-            idle_time = torch.tensor([
-                self.metrics[event].fraction_idle_time for event in event_list
-            ], dtype=torch.float32)
+            # Plain NumPy arrays; torch tensors pay allocator and dispatcher
+            # overhead that dwarfs the arithmetic at these sizes.
+            self_time = np.fromiter(
+                (self.metrics[event].self_time_ns for event in event_list),
+                dtype=np.float64, count=len(event_list))
+            idle_time = np.fromiter(
+                (self.metrics[event].fraction_idle_time
+                 for event in event_list),
+                dtype=np.float64, count=len(event_list))
             normalized_gain = (idle_time -
-                               torch.mean(idle_time)) / torch.std(idle_time)
+                               idle_time.mean()) / idle_time.std(ddof=1)
             normalized_self = (self_time -
-                               torch.mean(self_time)) / torch.std(self_time)
+                               self_time.mean()) / self_time.std(ddof=1)
             heuristic_score_list = normalized_gain + 0.6 * normalized_self
 
-            # Sort events by heuristic
-            event_list = [
-                event
-                for _, event in sorted(zip(heuristic_score_list, event_list),
-                                       key=lambda x: x[0],
-                                       reverse=True)
-            ]
-            event_list = event_list[:length]
+            # Sort events by heuristic. Only the top `length` events need
+            # ordering, so partition them out first instead of sorting the
+            # whole candidate list.
+            k = min(length, len(event_list))
+            if k <= 0:
+                return []
+            top_indices = np.argpartition(-heuristic_score_list, k - 1)[:k]
+            top_indices = top_indices[np.argsort(
+                -heuristic_score_list[top_indices], kind='stable')]
+            event_list = [event_list[i] for i in top_indices]
         return event_list
 
     def get_optimizable_events(self,